@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
 import socket
 import argparse
+import struct
 import time
 import sys
 import os
-import numpy as np
-import matplotlib.pyplot as plt
 from time import localtime, strftime
 
 # maximum port number
 MAX_PORT_NUM = 65535
 
+# fixed-size packet header: sequence number (uint32) + message type (uint8)
+HEADER = struct.Struct("!IB")
+
+# message type codes
+MSG_DATA = 0
+MSG_ACK = 1
+
+# human-readable names for message types in log output
+MSG_NAMES = {MSG_DATA: "DATA", MSG_ACK: "ACK"}
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Reliable UDP Client')
@@ -56,20 +65,34 @@ def usage(exit_code, exit_message):
     # exit the program using the exit_code
     sys.exit(exit_code)
 
-def create_packet(seq_num, message_type, payload=""):
-    """Create a packet with the protocol format."""
-    return f"{seq_num}|{message_type}|{payload}".encode()
+def create_packet(seq_num, message_type, payload=b""):
+    """Create a packet with the fixed binary header followed by the payload."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return HEADER.pack(seq_num, message_type) + payload
 
 def parse_packet(packet_data):
-    """Parse a packet according to the protocol format."""
-    try:
-        parts = packet_data.decode().split('|', 2)
-        if len(parts) < 3:
-            return None, None, None
-        return int(parts[0]), parts[1], parts[2]
-    except (UnicodeDecodeError, ValueError) as e:
-        print(f"Error parsing packet: {e}")
+    """Parse the fixed binary header of a packet."""
+    if len(packet_data) < HEADER.size:
         return None, None, None
+    seq_num, msg_type = HEADER.unpack_from(packet_data)
+    return seq_num, msg_type, packet_data[HEADER.size:]
+
+def set_socket_buffers(sock, rcvbuf=8*1024*1024, sndbuf=4*1024*1024):
+    """Enlarge the kernel socket buffers so bursts are not silently dropped.
+
+    The kernel may clamp the request; warn when the granted size is
+    smaller than asked (raising sysctl net.core.rmem_max/wmem_max lifts
+    the cap).
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    granted_rcv = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    granted_snd = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    if granted_rcv < rcvbuf:
+        print(f"Warning: kernel clamped SO_RCVBUF to {granted_rcv} bytes (requested {rcvbuf})")
+    if granted_snd < sndbuf:
+        print(f"Warning: kernel clamped SO_SNDBUF to {granted_snd} bytes (requested {sndbuf})")
 
 def main():
     args = parse_arguments()
@@ -79,9 +102,12 @@ def main():
     retransmissions = 0
     acks_received = 0
     
-    # Create UDP socket
+    # Create UDP socket and connect it to the fixed target so each send
+    # skips the per-call address conversion and lookup in sendto
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    
+    client_socket.connect((args.target_ip, args.target_port))
+    set_socket_buffers(client_socket)
+
     # Handle socket configuration based on timeout value
     if args.timeout == 0.0:
         # If timeout is 0, use a small but reasonable timeout
@@ -96,6 +122,11 @@ def main():
     
     # RTT tracking for metrics
     rtt_values = []
+
+    # Reusable receive buffer: recv_into fills it in place instead of
+    # allocating a fresh bytes object for every ACK
+    ack_buf = bytearray(1024)
+    ack_view = memoryview(ack_buf)
     
     # Start with sequence number 0
     seq_num = 0
@@ -104,15 +135,27 @@ def main():
     os.makedirs("graphs", exist_ok=True)
     
     print(f"UDP Client started. Connecting to {args.target_ip}:{args.target_port}")
-    # This line is no longer needed since we already print the timeout info when setting it
-    print("Type a message and press Enter to send. Type 'exit' to quit.")
+
+    # When stdin is piped from a file (benchmark runs) skip the prompt
+    # and read raw bytes: no per-line prompt flush, no str decode/encode
+    interactive = sys.stdin.isatty()
+    if interactive:
+        # This line is no longer needed since we already print the timeout info when setting it
+        print("Type a message and press Enter to send. Type 'exit' to quit.")
+    stdin_readline = sys.stdin.buffer.readline
     
     while True:
         # Get message from user
         try:
-            message = input("> ")
-            if message.lower() == 'exit':
-                break
+            if interactive:
+                message = input("> ")
+                if message.lower() == 'exit':
+                    break
+            else:
+                line = stdin_readline()
+                if not line or line == b'exit\n':
+                    break
+                message = line.rstrip(b'\n')
             
             max_retries = 5
             retry_count = 0
@@ -122,27 +165,29 @@ def main():
                 try:
                     # Send the packet if it's the first attempt or a retry
                     if retry_count == 0 or packet_sent_time is None:
-                        packet = create_packet(seq_num, "DATA", message)
-                        client_socket.sendto(packet, (args.target_ip, args.target_port))
-                        packet_sent_time = time.time()
+                        packet = create_packet(seq_num, MSG_DATA, message)
+                        client_socket.send(packet)
+                        # monotonic integer clock: RTT is unaffected by
+                        # wall-clock adjustments and keeps ns precision
+                        packet_sent_time = time.monotonic_ns()
                         packets_sent += 1
                         print(f"Sent packet with seq_num {seq_num}")
                     
                     # Wait for acknowledgment
                     try:
-                        data, addr = client_socket.recvfrom(1024)
-                        ack_seq, msg_type, _ = parse_packet(data)
+                        n = client_socket.recv_into(ack_buf)
+                        ack_seq, msg_type, _ = parse_packet(ack_view[:n])
                         
                         # Check if the acknowledgment matches our sequence number
-                        if msg_type == "ACK" and ack_seq == seq_num:
+                        if msg_type == MSG_ACK and ack_seq == seq_num:
                             acks_received += 1
-                            rtt = time.time() - packet_sent_time
+                            rtt = (time.monotonic_ns() - packet_sent_time) / 1e9
                             rtt_values.append(rtt)
                             print(f"Received ACK for seq_num {seq_num}. RTT: {rtt:.6f} seconds")
                             seq_num += 1  # Increment sequence number for next message
                             break  # Exit retry loop on successful ACK
                         else:
-                            print(f"Received unexpected packet. Expected ACK for {seq_num}, got {msg_type} for {ack_seq}")
+                            print(f"Received unexpected packet. Expected ACK for {seq_num}, got {MSG_NAMES.get(msg_type, msg_type)} for {ack_seq}")
                     
                     except socket.timeout:
                         retry_count += 1
@@ -183,6 +228,13 @@ def main():
 
     # Draw graph if we have data
     if packets_sent > 0:
+        # Import matplotlib lazily: it costs hundreds of milliseconds and
+        # tens of MB that runs without graphs never need. Agg skips GUI
+        # backend probing.
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
         # First graph: Packet statistics
         labels = ["Sent", "Received", "Retransmissions", "Lost"]
         values = [packets_sent, acks_received, retransmissions, packets_sent-acks_received]
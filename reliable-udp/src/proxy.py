@@ -1,19 +1,37 @@
 #!/usr/bin/env python3
 import socket
 import argparse
-import random
+import array
+import heapq
+import itertools
+import selectors
+import struct
 import time
 import threading
-import queue
 import sys
-import numpy as np
-import matplotlib.pyplot as plt
+import mmsg
 from time import localtime, strftime
-import re
 
 # maximum port number
 MAX_PORT_NUM = 65535
 
+# fixed-size packet header: sequence number (uint32) + message type (uint8)
+HEADER = struct.Struct("!IB")
+
+# message type codes
+MSG_DATA = 0
+MSG_ACK = 1
+
+# human-readable names for message types in log output
+MSG_NAMES = {MSG_DATA: "DATA", MSG_ACK: "ACK"}
+
+# indexes into the metrics counter array
+M_TOTAL, M_C2S, M_S2C, M_C2S_DROP, M_S2C_DROP, M_C2S_DELAY, M_S2C_DELAY = range(7)
+
+# capacity of the latency-sample ring (one sample per reporter tick;
+# an hour of history at the 1s default)
+MAX_DELAY_SAMPLES = 3600
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='UDP Proxy with Network Simulation')
@@ -44,69 +62,34 @@ def parse_arguments():
 
     # Error checking and handling
 
-    # if listen port is not numeric
-    if(str(args.listen_port).isnumeric() == False):
-
-        # show error message and exit
-        usage(1, "The listen port number must be a positive integer.")
-
-    # else if port number exceeds maximum valid port number
-    elif(int(args.listen_port) > MAX_PORT_NUM):
+    # argparse already parsed the ports as int, so only range-check them
+    if(args.listen_port < 0 or args.listen_port > MAX_PORT_NUM):
 
         # show error message and exit
         usage(1, "Valid listen port number range is between 0 to 65535.")
 
-    # if server port is not numeric
-    if(str(args.server_port).isnumeric() == False):
-
-        # show error message and exit
-        usage(1, "The server port number must be a positive integer.")
-
-    # else if port number exceeds maximum valid port number
-    elif(int(args.server_port) > MAX_PORT_NUM):
+    if(args.server_port < 0 or args.server_port > MAX_PORT_NUM):
 
         # show error message and exit
         usage(1, "Valid server port number range is between 0 to 65535.")
 
-    # if client drop is a negative number
-    if(int(args.client_drop) < 0):
-
-        # show error message and exit
-        usage(1, "The client drop rate cannot be negative.")
-
-    # if server drop is a negative number
-    if(int(args.server_drop) < 0):
+    # the four percentage arguments share the same 0-100 bound; comparing
+    # the float directly also catches fractional negatives that the old
+    # int() truncation let through
+    for rate_name, rate_value in [("client drop", args.client_drop),
+                                  ("server drop", args.server_drop),
+                                  ("client delay", args.client_delay),
+                                  ("server delay", args.server_delay)]:
 
-        # show error message and exit
-        usage(1, "The server drop rate cannot be negative.")
-
-    # if client delay is a negative number
-    if(int(args.client_delay) < 0):
-
-        # show error message and exit
-        usage(1, "The client delay rate cannot be negative.")
+        # if the percentage is outside the valid range
+        if(rate_value < 0 or rate_value > 100):
 
-    # if server delay is a negative number
-    if(int(args.server_delay) < 0):
+            # show error message and exit
+            usage(1, f"The {rate_name} rate must be between 0 and 100.")
 
-        # show error message and exit
-        usage(1, "The server delay rate cannot be negative.")
-
-    # check if the client/server delay time is given in ranges
-    clientTimeInRange = re.search("^.+-.*$", str(args.client_delay_time))
-    serverTimeInRange = re.search("^.+-.*$", str(args.server_delay_time))
-
-    # if client delay time is a negative number
-    if(clientTimeInRange == None and int(args.client_delay_time) < 0):
-
-        # show error message and exit
-        usage(1, "The client delay time cannot be negative.")
-
-    # if server delay time is a negative number
-    if(serverTimeInRange == None and int(args.server_delay_time) < 0):
-
-        # show error message and exit
-        usage(1, "The server delay time cannot be negative.")
+    # a '-' marks a min-max range; only fixed values need the sign check
+    validate_delay_time("client", args.client_delay_time)
+    validate_delay_time("server", args.server_delay_time)
     
     # Convert percentages to probabilities
     args.client_drop /= 100.0
@@ -131,6 +114,16 @@ def usage(exit_code, exit_message):
     # exit the program using the exit_code
     sys.exit(exit_code)
 
+def validate_delay_time(name, value):
+    """Exit with an error when a fixed delay time is negative."""
+
+    # a dash past the first character marks a min-max range; a leading
+    # dash is just the sign of a negative fixed value
+    if('-' not in value[1:] and int(value) < 0):
+
+        # show error message and exit
+        usage(1, f"The {name} delay time cannot be negative.")
+
 def parse_delay_time(delay_time_str):
     """Parse delay time string into a tuple of (min, max) delays in seconds."""
     if '-' in delay_time_str:
@@ -141,34 +134,207 @@ def parse_delay_time(delay_time_str):
         return (delay_sec, delay_sec)
 
 def parse_packet(packet_data):
-    """Parse a packet according to our protocol format."""
-    try:
-        parts = packet_data.decode().split('|', 2)
-        if len(parts) < 3:
-            return None, None, None
-        return int(parts[0]), parts[1], parts[2]
-    except:
+    """Parse the fixed binary header of a packet."""
+    if len(packet_data) < HEADER.size:
         return None, None, None
-
-def should_drop_packet(drop_probability):
-    """Determine if a packet should be dropped based on probability."""
-    return random.random() < drop_probability
-
-def should_delay_packet(delay_probability):
-    """Determine if a packet should be delayed based on probability."""
-    return random.random() < delay_probability
-
-def get_random_delay(delay_range):
-    """Get a random delay time within the specified range."""
-    min_delay, max_delay = delay_range
-    if min_delay == max_delay:
-        return min_delay
-    return random.uniform(min_delay, max_delay)
+    seq_num, msg_type = HEADER.unpack_from(packet_data)
+    return seq_num, msg_type, packet_data[HEADER.size:]
+
+# probabilities are quantized to integer thresholds in [0, 2**32] so the
+# per-packet check is an integer compare against a 32-bit random draw
+PROB_SCALE = 1 << 32
+
+class RandPool:
+    """Pool of pre-generated uniform 32-bit random integers.
+
+    Drawing randoms in large batches from numpy's vectorized RNG
+    amortizes the per-call interpreter overhead across the pool size,
+    and 32-bit integers are cheaper to generate and compare than the
+    53-bit floats random.random() builds.
+    """
+
+    def __init__(self, size=1024):
+        # numpy is imported lazily so module import stays cheap; the
+        # first pool construction pays the cost once
+        import numpy as np
+        self._np = np
+        self._rng = np.random.default_rng()
+        self._size = size
+        self._buf = self._rng.integers(0, PROB_SCALE, size, dtype=np.uint32)
+        self._i = 0
+
+    def next(self):
+        """Return the next pre-generated random, refilling when exhausted."""
+        if self._i >= self._size:
+            self._buf = self._rng.integers(0, PROB_SCALE, self._size,
+                                           dtype=self._np.uint32)
+            self._i = 0
+        value = self._buf[self._i]
+        self._i += 1
+        return value
+
+# separate pools keep the drop, delay, and delay-time draws independent;
+# they start out empty and are built on first use so that importing this
+# module does not pull in numpy
+_drop_pool = None
+_delay_pool = None
+_delay_time_pool = None
+
+def _init_pools():
+    """Construct the shared random pools on first use."""
+    global _drop_pool, _delay_pool, _delay_time_pool
+    _drop_pool = RandPool()
+    _delay_pool = RandPool()
+    _delay_time_pool = RandPool()
+
+# action codes returned by decide_action
+ACTION_FORWARD = 0
+ACTION_DROP = 1
+ACTION_DELAY = 2
+
+def decide_action(drop_threshold, delay_threshold, delay_range):
+    """Decide the fate of one packet in a single call.
+
+    The thresholds are the integer quantizations of the drop/delay
+    probabilities (see update_thresholds), so each check is an integer
+    compare against a pooled 32-bit draw. Returns (action,
+    delay_seconds). Collapsing the separate drop/delay/random-delay
+    helpers into one function means the hot path pays one Python call
+    per packet instead of up to three.
+    """
+    if _drop_pool is None:
+        _init_pools()
+    if _drop_pool.next() < drop_threshold:
+        return ACTION_DROP, 0.0
+    if _delay_pool.next() < delay_threshold:
+        min_delay, max_delay = delay_range
+        if min_delay == max_delay:
+            return ACTION_DELAY, min_delay
+        return ACTION_DELAY, min_delay + _delay_time_pool.next() * ((max_delay - min_delay) / PROB_SCALE)
+    return ACTION_FORWARD, 0.0
+
+def update_thresholds(config):
+    """Recompute the integer thresholds decide_action compares against.
+
+    Must be called whenever one of the probability floats in the shared
+    config changes so the hot path keeps seeing consistent values.
+    """
+    config.client_drop_thr = int(config.client_drop * PROB_SCALE)
+    config.server_drop_thr = int(config.server_drop * PROB_SCALE)
+    config.client_delay_thr = int(config.client_delay * PROB_SCALE)
+    config.server_delay_thr = int(config.server_delay * PROB_SCALE)
+
+class Config:
+    """Mutable runtime configuration shared with the command interface.
+
+    A __slots__ class instead of a dict: attribute access is a
+    fixed-offset load rather than a hash-and-probe per field, which
+    matters when the forwarding loop consults it for every packet.
+    """
+
+    __slots__ = ('client_drop', 'server_drop', 'client_delay',
+                 'server_delay', 'client_delay_time_range',
+                 'server_delay_time_range', 'verbose',
+                 'client_drop_thr', 'server_drop_thr',
+                 'client_delay_thr', 'server_delay_thr')
+
+    def __init__(self, args):
+        self.client_drop = args.client_drop
+        self.server_drop = args.server_drop
+        self.client_delay = args.client_delay
+        self.server_delay = args.server_delay
+        self.client_delay_time_range = args.client_delay_time_range
+        self.server_delay_time_range = args.server_delay_time_range
+        self.verbose = args.verbose
+        update_thresholds(self)
+
+def set_socket_buffers(sock, rcvbuf=8*1024*1024, sndbuf=4*1024*1024):
+    """Enlarge the kernel socket buffers so bursts are not silently dropped.
+
+    The kernel may clamp the request; warn when the granted size is
+    smaller than asked (raising sysctl net.core.rmem_max/wmem_max lifts
+    the cap).
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    granted_rcv = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    granted_snd = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    if granted_rcv < rcvbuf:
+        print(f"Warning: kernel clamped SO_RCVBUF to {granted_rcv} bytes (requested {rcvbuf})")
+    if granted_snd < sndbuf:
+        print(f"Warning: kernel clamped SO_SNDBUF to {granted_snd} bytes (requested {sndbuf})")
+
+# timestamp for log lines, refreshed at most once per second
+_last_log_sec = 0
+_last_log_ts = ""
 
 def log(verbose, message, force=False):
     """Log a message if verbose logging is enabled or forced."""
+    global _last_log_sec, _last_log_ts
     if verbose or force:
-        print(f"[{time.strftime('%H:%M:%S')}] {message}")
+        now = int(time.time())
+        if now != _last_log_sec:
+            _last_log_ts = time.strftime('%H:%M:%S')
+            _last_log_sec = now
+        print(f"[{_last_log_ts}] {message}")
+
+def report_metrics(metrics, delay_sums, delay_samples, sample_state, interval=1.0):
+    """Print a metrics summary once per interval from a background thread.
+
+    Runs off the I/O loop so the forwarding path never stalls on stdout;
+    the summary is assembled into one string and flushed with a single
+    write. Also samples the per-tick delay accumulators into the
+    preallocated latency ring for the shutdown graph.
+    """
+    last_total = 0
+    while True:
+        time.sleep(interval)
+
+        # skip quiet intervals so an idle proxy stays silent
+        total = metrics[M_TOTAL]
+        if total == last_total:
+            continue
+        last_total = total
+
+        c2s_total = metrics[M_C2S]
+        c2s_drop_pct = (metrics[M_C2S_DROP] / max(1, c2s_total)) * 100
+        c2s_delay_pct = (metrics[M_C2S_DELAY] / max(1, c2s_total)) * 100
+        c2s_forward_pct = 100 - c2s_drop_pct - c2s_delay_pct
+
+        s2c_total = metrics[M_S2C]
+        s2c_drop_pct = (metrics[M_S2C_DROP] / max(1, s2c_total)) * 100
+        s2c_delay_pct = (metrics[M_S2C_DELAY] / max(1, s2c_total)) * 100
+        s2c_forward_pct = 100 - s2c_drop_pct - s2c_delay_pct
+
+        summary = "\n".join([
+            "",
+            "=" * 50,
+            "PROXY METRICS SUMMARY:",
+            "=" * 50,
+            f"Total packets handled: {total}",
+            "",
+            f"Client→Server: {c2s_total} packets",
+            f"  - Forwarded: {c2s_total - metrics[M_C2S_DROP] - metrics[M_C2S_DELAY]} ({c2s_forward_pct:.1f}%)",
+            f"  - Dropped:   {metrics[M_C2S_DROP]} ({c2s_drop_pct:.1f}%)",
+            f"  - Delayed:   {metrics[M_C2S_DELAY]} ({c2s_delay_pct:.1f}%)",
+            "",
+            f"Server→Client: {s2c_total} packets",
+            f"  - Forwarded: {s2c_total - metrics[M_S2C_DROP] - metrics[M_S2C_DELAY]} ({s2c_forward_pct:.1f}%)",
+            f"  - Dropped:   {metrics[M_S2C_DROP]} ({s2c_drop_pct:.1f}%)",
+            f"  - Delayed:   {metrics[M_S2C_DELAY]} ({s2c_delay_pct:.1f}%)",
+            "=" * 50,
+            "",
+        ])
+        sys.stdout.write(summary)
+        sys.stdout.flush()
+
+        # sample the delay accumulated since the last tick into the
+        # ring, overwriting the oldest slot once full
+        i = sample_state[0]
+        delay_samples[i % MAX_DELAY_SAMPLES] = delay_sums[0] + delay_sums[1]
+        sample_state[0] = i + 1
+        delay_sums[0] = 0.0
+        delay_sums[1] = 0.0
 
 def print_current_config(config):
     """Print the current configuration settings."""
@@ -176,29 +342,130 @@ def print_current_config(config):
     print("CURRENT NETWORK SIMULATION SETTINGS:")
     print("="*50)
     print(f"  Client→Server:")
-    print(f"    - Drop chance: {config['client_drop']*100:.1f}%")
-    print(f"    - Delay chance: {config['client_delay']*100:.1f}%")
-    print(f"    - Delay time: {config['client_delay_time_range'][0]*1000:.0f}-{config['client_delay_time_range'][1]*1000:.0f}ms")
+    print(f"    - Drop chance: {config.client_drop*100:.1f}%")
+    print(f"    - Delay chance: {config.client_delay*100:.1f}%")
+    print(f"    - Delay time: {config.client_delay_time_range[0]*1000:.0f}-{config.client_delay_time_range[1]*1000:.0f}ms")
     print(f"  Server→Client:")
-    print(f"    - Drop chance: {config['server_drop']*100:.1f}%")
-    print(f"    - Delay chance: {config['server_delay']*100:.1f}%")
-    print(f"    - Delay time: {config['server_delay_time_range'][0]*1000:.0f}-{config['server_delay_time_range'][1]*1000:.0f}ms")
+    print(f"    - Drop chance: {config.server_drop*100:.1f}%")
+    print(f"    - Delay chance: {config.server_delay*100:.1f}%")
+    print(f"    - Delay time: {config.server_delay_time_range[0]*1000:.0f}-{config.server_delay_time_range[1]*1000:.0f}ms")
     print("="*50)
 
+# named presets for the command interface: description plus the config
+# attribute values the preset applies
+PRESETS = {
+    'perfect': ("0% drop, 0% delay",
+                {'client_drop': 0.0, 'server_drop': 0.0,
+                 'client_delay': 0.0, 'server_delay': 0.0,
+                 'client_delay_time_range': (0.1, 0.1),
+                 'server_delay_time_range': (0.1, 0.1)}),
+    'mild': ("10% drop, 20% delay (100ms)",
+             {'client_drop': 0.1, 'server_drop': 0.1,
+              'client_delay': 0.2, 'server_delay': 0.2,
+              'client_delay_time_range': (0.1, 0.1),
+              'server_delay_time_range': (0.1, 0.1)}),
+    'moderate': ("25% drop, 40% delay (100-300ms)",
+                 {'client_drop': 0.25, 'server_drop': 0.25,
+                  'client_delay': 0.4, 'server_delay': 0.4,
+                  'client_delay_time_range': (0.1, 0.3),
+                  'server_delay_time_range': (0.1, 0.3)}),
+    'severe': ("50% drop, 60% delay (200-500ms)",
+               {'client_drop': 0.5, 'server_drop': 0.5,
+                'client_delay': 0.6, 'server_delay': 0.6,
+                'client_delay_time_range': (0.2, 0.5),
+                'server_delay_time_range': (0.2, 0.5)}),
+    'chaotic': ("70% drop, 80% delay (300-1000ms)",
+                {'client_drop': 0.7, 'server_drop': 0.7,
+                 'client_delay': 0.8, 'server_delay': 0.8,
+                 'client_delay_time_range': (0.3, 1.0),
+                 'server_delay_time_range': (0.3, 1.0)}),
+    'blackhole': ("100% drop, 0% delay",
+                  {'client_drop': 1.0, 'server_drop': 1.0,
+                   'client_delay': 0.0, 'server_delay': 0.0,
+                   'client_delay_time_range': (0.1, 0.1),
+                   'server_delay_time_range': (0.1, 0.1)}),
+}
+
+def apply_preset(config, settings):
+    """Apply a preset's attribute values to the shared config."""
+    for attr, value in settings.items():
+        setattr(config, attr, value)
+
+def _set_percent(config, attr, label, value):
+    """Set a drop/delay chance attribute from a 0-100 percent string."""
+    try:
+        percent = float(value)
+    except ValueError:
+        print("Invalid value. Must be a number between 0 and 100")
+        return
+    if 0 <= percent <= 100:
+        setattr(config, attr, percent / 100.0)
+        print(f"{label} set to {percent}%")
+    else:
+        print("Value must be between 0 and 100")
+
+def _set_delay_time(config, attr, label, value):
+    """Set a fixed delay-time attribute from a milliseconds string."""
+    try:
+        delay_ms = float(value)
+    except ValueError:
+        print("Invalid value. Must be a non-negative number")
+        return
+    if delay_ms >= 0:
+        delay_sec = delay_ms / 1000.0
+        setattr(config, attr, (delay_sec, delay_sec))
+        print(f"{label} set to {delay_ms}ms")
+    else:
+        print("Value must be non-negative")
+
+def _set_delay_range(config, attr, label, value):
+    """Set a delay-time range attribute from a 'min-max' milliseconds string."""
+    min_max = value.split('-')
+    if len(min_max) != 2:
+        print("Invalid range format. Use 'min-max'")
+        return
+    try:
+        min_ms = float(min_max[0])
+        max_ms = float(min_max[1])
+    except ValueError:
+        print("Invalid values. Must be numbers in format 'min-max'")
+        return
+    if min_ms >= 0 and max_ms >= min_ms:
+        setattr(config, attr, (min_ms / 1000.0, max_ms / 1000.0))
+        print(f"{label} set to {min_ms}-{max_ms}ms")
+    else:
+        print("Min must be non-negative and max must be >= min")
+
+# maps 'set' parameter names to (setter, config attribute, display label)
+SETTERS = {
+    'client-drop': (_set_percent, 'client_drop', "Client drop chance"),
+    'server-drop': (_set_percent, 'server_drop', "Server drop chance"),
+    'client-delay': (_set_percent, 'client_delay', "Client delay chance"),
+    'server-delay': (_set_percent, 'server_delay', "Server delay chance"),
+    'client-delay-time': (_set_delay_time, 'client_delay_time_range', "Client delay time"),
+    'server-delay-time': (_set_delay_time, 'server_delay_time_range', "Server delay time"),
+    'client-delay-range': (_set_delay_range, 'client_delay_time_range', "Client delay range"),
+    'server-delay-range': (_set_delay_range, 'server_delay_time_range', "Server delay range"),
+}
+
 def command_interface(config):
     """Command interface for dynamic parameter updates."""
     print("\nDynamic Configuration Interface Active")
     print("Enter 'help' for available commands")
-    
+
     while True:
         try:
             command = input("\nCommand> ").strip()
-            
-            if command.lower() == 'quit' or command.lower() == 'exit':
+
+            # lowercase and split once, then dispatch on the first word
+            parts = command.lower().split()
+            head = parts[0] if parts else ''
+
+            if head == 'quit' or head == 'exit':
                 print("Exiting command interface...")
                 break
-                
-            elif command.lower() == 'help':
+
+            elif head == 'help':
                 print("\nAvailable commands:")
                 print("  show                - Display current configuration")
                 print("  set <param> <value> - Set a specific parameter")
@@ -215,208 +482,48 @@ def command_interface(config):
                 print("  server-delay-time <ms>     - Server delay time in ms")
                 print("  client-delay-range <min-max> - Client delay range in ms")
                 print("  server-delay-range <min-max> - Server delay range in ms")
-            
-            elif command.lower() == 'show':
+
+            elif head == 'show':
                 print_current_config(config)
-                
-            elif command.lower() == 'reset':
-                config['client_drop'] = 0.0
-                config['server_drop'] = 0.0
-                config['client_delay'] = 0.0
-                config['server_delay'] = 0.0
-                config['client_delay_time_range'] = (0.1, 0.1)
-                config['server_delay_time_range'] = (0.1, 0.1)
+
+            elif head == 'reset':
+                apply_preset(config, PRESETS['perfect'][1])
                 print("All parameters reset to 0")
-                
-            elif command.lower() == 'presets':
+
+            elif head == 'presets':
                 print("\nAvailable presets:")
-                print("  perfect    - 0% drop, 0% delay")
-                print("  mild       - 10% drop, 20% delay (100ms)")
-                print("  moderate   - 25% drop, 40% delay (100-300ms)")
-                print("  severe     - 50% drop, 60% delay (200-500ms)")
-                print("  chaotic    - 70% drop, 80% delay (300-1000ms)")
-                print("  blackhole  - 100% drop, 0% delay")
-                
-            elif command.lower().startswith('preset '):
-                preset_name = command.split(' ')[1].strip().lower()
-                
-                if preset_name == 'perfect':
-                    config['client_drop'] = 0.0
-                    config['server_drop'] = 0.0
-                    config['client_delay'] = 0.0
-                    config['server_delay'] = 0.0
-                    config['client_delay_time_range'] = (0.1, 0.1)
-                    config['server_delay_time_range'] = (0.1, 0.1)
-                    print("Loaded 'perfect' preset")
-                
-                elif preset_name == 'mild':
-                    config['client_drop'] = 0.1
-                    config['server_drop'] = 0.1
-                    config['client_delay'] = 0.2
-                    config['server_delay'] = 0.2
-                    config['client_delay_time_range'] = (0.1, 0.1)
-                    config['server_delay_time_range'] = (0.1, 0.1)
-                    print("Loaded 'mild' preset")
-                
-                elif preset_name == 'moderate':
-                    config['client_drop'] = 0.25
-                    config['server_drop'] = 0.25
-                    config['client_delay'] = 0.4
-                    config['server_delay'] = 0.4
-                    config['client_delay_time_range'] = (0.1, 0.3)
-                    config['server_delay_time_range'] = (0.1, 0.3)
-                    print("Loaded 'moderate' preset")
-                
-                elif preset_name == 'severe':
-                    config['client_drop'] = 0.5
-                    config['server_drop'] = 0.5
-                    config['client_delay'] = 0.6
-                    config['server_delay'] = 0.6
-                    config['client_delay_time_range'] = (0.2, 0.5)
-                    config['server_delay_time_range'] = (0.2, 0.5)
-                    print("Loaded 'severe' preset")
-                
-                elif preset_name == 'chaotic':
-                    config['client_drop'] = 0.7
-                    config['server_drop'] = 0.7
-                    config['client_delay'] = 0.8
-                    config['server_delay'] = 0.8
-                    config['client_delay_time_range'] = (0.3, 1.0)
-                    config['server_delay_time_range'] = (0.3, 1.0)
-                    print("Loaded 'chaotic' preset")
-                
-                elif preset_name == 'blackhole':
-                    config['client_drop'] = 1.0
-                    config['server_drop'] = 1.0
-                    config['client_delay'] = 0.0
-                    config['server_delay'] = 0.0
-                    config['client_delay_time_range'] = (0.1, 0.1)
-                    config['server_delay_time_range'] = (0.1, 0.1)
-                    print("Loaded 'blackhole' preset")
-                
+                for preset_name, (description, _settings) in PRESETS.items():
+                    print(f"  {preset_name:<10} - {description}")
+
+            elif head == 'preset':
+                preset_name = parts[1] if len(parts) > 1 else ''
+                if preset_name in PRESETS:
+                    apply_preset(config, PRESETS[preset_name][1])
+                    print(f"Loaded '{preset_name}' preset")
                 else:
                     print(f"Unknown preset: {preset_name}")
-            
-            elif command.lower().startswith('set '):
-                parts = command.split(' ')
+
+            elif head == 'set':
                 if len(parts) < 3:
                     print("Invalid command format. Use 'set <param> <value>'")
                     continue
-                
-                param = parts[1].lower()
+
+                param = parts[1]
                 value = parts[2]
-                
-                if param == 'client-drop':
-                    try:
-                        drop = float(value)
-                        if 0 <= drop <= 100:
-                            config['client_drop'] = drop / 100.0
-                            print(f"Client drop chance set to {drop}%")
-                        else:
-                            print("Value must be between 0 and 100")
-                    except ValueError:
-                        print("Invalid value. Must be a number between 0 and 100")
-                
-                elif param == 'server-drop':
-                    try:
-                        drop = float(value)
-                        if 0 <= drop <= 100:
-                            config['server_drop'] = drop / 100.0
-                            print(f"Server drop chance set to {drop}%")
-                        else:
-                            print("Value must be between 0 and 100")
-                    except ValueError:
-                        print("Invalid value. Must be a number between 0 and 100")
-                
-                elif param == 'client-delay':
-                    try:
-                        delay = float(value)
-                        if 0 <= delay <= 100:
-                            config['client_delay'] = delay / 100.0
-                            print(f"Client delay chance set to {delay}%")
-                        else:
-                            print("Value must be between 0 and 100")
-                    except ValueError:
-                        print("Invalid value. Must be a number between 0 and 100")
-                
-                elif param == 'server-delay':
-                    try:
-                        delay = float(value)
-                        if 0 <= delay <= 100:
-                            config['server_delay'] = delay / 100.0
-                            print(f"Server delay chance set to {delay}%")
-                        else:
-                            print("Value must be between 0 and 100")
-                    except ValueError:
-                        print("Invalid value. Must be a number between 0 and 100")
-                
-                elif param == 'client-delay-time':
-                    try:
-                        delay_ms = float(value)
-                        if delay_ms >= 0:
-                            delay_sec = delay_ms / 1000.0
-                            config['client_delay_time_range'] = (delay_sec, delay_sec)
-                            print(f"Client delay time set to {delay_ms}ms")
-                        else:
-                            print("Value must be non-negative")
-                    except ValueError:
-                        print("Invalid value. Must be a non-negative number")
-                
-                elif param == 'server-delay-time':
-                    try:
-                        delay_ms = float(value)
-                        if delay_ms >= 0:
-                            delay_sec = delay_ms / 1000.0
-                            config['server_delay_time_range'] = (delay_sec, delay_sec)
-                            print(f"Server delay time set to {delay_ms}ms")
-                        else:
-                            print("Value must be non-negative")
-                    except ValueError:
-                        print("Invalid value. Must be a non-negative number")
-                
-                elif param == 'client-delay-range':
-                    try:
-                        min_max = value.split('-')
-                        if len(min_max) != 2:
-                            print("Invalid range format. Use 'min-max'")
-                            continue
-                        
-                        min_ms = float(min_max[0])
-                        max_ms = float(min_max[1])
-                        
-                        if min_ms >= 0 and max_ms >= min_ms:
-                            config['client_delay_time_range'] = (min_ms / 1000.0, max_ms / 1000.0)
-                            print(f"Client delay range set to {min_ms}-{max_ms}ms")
-                        else:
-                            print("Min must be non-negative and max must be >= min")
-                    except ValueError:
-                        print("Invalid values. Must be numbers in format 'min-max'")
-                
-                elif param == 'server-delay-range':
-                    try:
-                        min_max = value.split('-')
-                        if len(min_max) != 2:
-                            print("Invalid range format. Use 'min-max'")
-                            continue
-                        
-                        min_ms = float(min_max[0])
-                        max_ms = float(min_max[1])
-                        
-                        if min_ms >= 0 and max_ms >= min_ms:
-                            config['server_delay_time_range'] = (min_ms / 1000.0, max_ms / 1000.0)
-                            print(f"Server delay range set to {min_ms}-{max_ms}ms")
-                        else:
-                            print("Min must be non-negative and max must be >= min")
-                    except ValueError:
-                        print("Invalid values. Must be numbers in format 'min-max'")
-                
+
+                if param in SETTERS:
+                    setter, attr, label = SETTERS[param]
+                    setter(config, attr, label, value)
                 else:
                     print(f"Unknown parameter: {param}")
-            
+
             else:
                 print(f"Unknown command: {command}")
                 print("Enter 'help' for available commands")
-                
+
+            # refresh the integer thresholds in case a probability changed
+            update_thresholds(config)
+
         except KeyboardInterrupt:
             print("\nExiting command interface...")
             break
@@ -426,48 +533,54 @@ def command_interface(config):
 def main():
     args = parse_arguments()
     
-    # Create a shared configuration dictionary
-    config = {
-        'client_drop': args.client_drop,
-        'server_drop': args.server_drop,
-        'client_delay': args.client_delay,
-        'server_delay': args.server_delay,
-        'client_delay_time_range': args.client_delay_time_range,
-        'server_delay_time_range': args.server_delay_time_range,
-        'verbose': args.verbose
-    }
+    # Create the shared runtime configuration
+    config = Config(args)
     
     # Create UDP socket for the proxy
     proxy_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     proxy_socket.bind((args.listen_ip, args.listen_port))
-    
+    set_socket_buffers(proxy_socket)
+
     # Server address
     server_addr = (args.server_ip, args.server_port)
+
+    # Dedicated socket for the server direction, connected once so every
+    # send skips the per-call address conversion and lookup in sendto
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_sock.connect(server_addr)
+    set_socket_buffers(server_sock)
     
     # Track the latest client address
     latest_client = None
     
-    # Create a queue for delayed packets
-    delayed_packets = queue.Queue()
+    # Min-heap of delayed packets keyed by send time:
+    # entries are (send_time, tiebreak, target_addr, data) where a target
+    # of None means the connected server socket
+    pending_delays = []
+    delay_tiebreak = itertools.count()
+
+    # Forwarded packets accumulated for one batched sendmmsg flush,
+    # split by direction since the server side uses a connected socket
+    pending_to_client = []
+    pending_to_server = []
+
+    # Preallocated recvmmsg state for batched receives
+    receiver = mmsg.BatchReceiver(2048)
     
-    # Metrics
-    metrics = {
-        'client_to_server_packets': 0,
-        'server_to_client_packets': 0,
-        'client_to_server_dropped': 0,
-        'server_to_client_dropped': 0,
-        'client_to_server_delayed': 0,
-        'server_to_client_delayed': 0,
-        'total_packets': 0
-    }
-
-    # Delay Array
-    delayTotal = []
-    delayClient = []
-    delayServer = []
-
-    # Delay starts from 0 ms latency
-    delayTotal.append(0)
+    # Metrics: contiguous unboxed int64 counters indexed by the M_*
+    # constants - incrementing a slot skips dict hashing and PyLong
+    # boxing per packet
+    metrics = array.array('q', [0] * 7)
+
+    # Preallocated ring of per-tick delay samples for the latency graph
+    # plus the shared write count; slot 0 holds the initial 0ms sample
+    delay_samples = array.array('d', [0.0] * MAX_DELAY_SAMPLES)
+    sample_state = array.array('q', [1])
+
+    # Running sums of delay applied since the last metrics tick
+    # ([0] = client direction, [1] = server direction); the reporter
+    # thread samples and resets them once per interval
+    delay_sums = array.array('d', [0.0, 0.0])
     
     print("\n" + "="*50)
     print("UDP PROXY WITH NETWORK SIMULATION")
@@ -477,194 +590,259 @@ def main():
     print(f"FORWARDING TO: {args.server_ip}:{args.server_port}")
     print("\nNETWORK SIMULATION SETTINGS:")
     print(f"  Client→Server:")
-    print(f"    - Drop chance: {config['client_drop']*100:.1f}%")
-    print(f"    - Delay chance: {config['client_delay']*100:.1f}%")
-    print(f"    - Delay time: {config['client_delay_time_range'][0]*1000:.0f}-{config['client_delay_time_range'][1]*1000:.0f}ms")
+    print(f"    - Drop chance: {config.client_drop*100:.1f}%")
+    print(f"    - Delay chance: {config.client_delay*100:.1f}%")
+    print(f"    - Delay time: {config.client_delay_time_range[0]*1000:.0f}-{config.client_delay_time_range[1]*1000:.0f}ms")
     print(f"  Server→Client:")
-    print(f"    - Drop chance: {config['server_drop']*100:.1f}%")
-    print(f"    - Delay chance: {config['server_delay']*100:.1f}%")
-    print(f"    - Delay time: {config['server_delay_time_range'][0]*1000:.0f}-{config['server_delay_time_range'][1]*1000:.0f}ms")
+    print(f"    - Drop chance: {config.server_drop*100:.1f}%")
+    print(f"    - Delay chance: {config.server_delay*100:.1f}%")
+    print(f"    - Delay time: {config.server_delay_time_range[0]*1000:.0f}-{config.server_delay_time_range[1]*1000:.0f}ms")
     print("="*50)
     
-    # Function to process delayed packets
-    def process_delayed_packets():
-        while True:
-            try:
-                # Get the next delayed packet from the queue
-                # Format: (send_time, socket, target_addr, data)
-                send_time, sock, addr, data = delayed_packets.get()
-                
-                # Calculate how much longer to wait
-                now = time.time()
-                wait_time = max(0, send_time - now)
-                
-                if wait_time > 0:
-                    time.sleep(wait_time)
-                
-                # Try to parse the packet for logging
-                seq_num, msg_type, _ = parse_packet(data)
-                packet_type = f"seq={seq_num}, type={msg_type}" if seq_num is not None else "unparseable"
-                
-                # Send the packet
-                sock.sendto(data, addr)
-                log(config['verbose'], f"  DELIVERED delayed packet ({packet_type}) to {addr}", force=True)
-                
-                # Mark the task as done
-                delayed_packets.task_done()
-            except Exception as e:
-                print(f"Error in delayed packet handler: {e}")
-    
-    # Start the delayed packet thread
-    delay_thread = threading.Thread(target=process_delayed_packets, daemon=True)
-    delay_thread.start()
-    
     # Start the command interface thread
     command_thread = threading.Thread(target=command_interface, args=(config,), daemon=True)
     command_thread.start()
+
+    # Start the metrics reporter thread (prints at most once per second,
+    # keeping stdout flushes off the forwarding path)
+    metrics_thread = threading.Thread(target=report_metrics,
+                                      args=(metrics, delay_sums,
+                                            delay_samples, sample_state),
+                                      daemon=True)
+    metrics_thread.start()
     
     print("Proxy ready to receive packets...")
     print("Command interface started in parallel. Type 'help' for available commands.")
-    
+
+    # Hoist the verbose flag into a local: it never changes at runtime and
+    # gating log formatting on it keeps f-string work off the hot path
+    verbose = config.verbose
+
+    # Hoist frequently used bound methods and module globals into locals;
+    # LOAD_FAST in the loop body is much cheaper than LOAD_ATTR per packet
+    recv_batch = receiver.recv_batch
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    monotonic_ns = time.monotonic_ns
+
+    # epoll (via DefaultSelector) scales better than select() as sockets
+    # are added and skips rebuilding the fd sets on every call
+    sel = selectors.DefaultSelector()
+    sel.register(proxy_socket, selectors.EVENT_READ)
+    sel.register(server_sock, selectors.EVENT_READ)
+    sel_select = sel.select
+
     try:
         while True:
-            # Receive data from either client or server
-            data, addr = proxy_socket.recvfrom(2048)
-            metrics['total_packets'] += 1
-            
-            # Try to parse the packet
-            seq_num, msg_type, payload = parse_packet(data)
-            
-            # Check if packet is from server or client
-            if addr[0] == args.server_ip and addr[1] == args.server_port:
-                # Packet from server to client (ACK)
-                metrics['server_to_client_packets'] += 1
-                
-                # Detailed packet logging
-                packet_info = f"SERVER → CLIENT: "
-                if seq_num is not None and msg_type is not None:
-                    packet_info += f"seq={seq_num}, type={msg_type}"
-                    if msg_type == "ACK":
-                        packet_info += f" (Acknowledgment for sequence {seq_num})"
-                    elif msg_type == "DATA":
-                        packet_info += f", payload_size={len(payload or '')}"
-                else:
-                    packet_info += f"[Unparseable packet: {data[:20]}...]"
-                
-                log(config['verbose'], packet_info, force=True)
-                
-                if latest_client:
-                    # Check if we should drop this packet (using dynamic config)
-                    if should_drop_packet(config['server_drop']):
-                        metrics['server_to_client_dropped'] += 1
-                        log(config['verbose'], f"  ACTION: DROPPED packet to client (probability: {config['server_drop']*100:.1f}%)", force=True)
-                    elif should_delay_packet(config['server_delay']):
-                        # Calculate when to send the packet (using dynamic config)
-                        delay = get_random_delay(config['server_delay_time_range'])
-                        send_time = time.time() + delay
-                        
-                        # Queue the packet for delayed sending
-                        delayed_packets.put((send_time, proxy_socket, latest_client, data))
-                        metrics['server_to_client_delayed'] += 1
-                        log(config['verbose'], f"  ACTION: DELAYED packet to client by {delay*1000:.1f}ms", force=True)
-                    
-                        # Add delay time to server delay array
-                        delayServer.append(delay)
-                    else:
-                        # Forward to the client immediately
-                        log(config['verbose'], f"  ACTION: FORWARDED to client: {latest_client}", force=True)
-                        proxy_socket.sendto(data, latest_client)
-                else:
-                    print(f"  ERROR: No client to forward to. Packet dropped.")
+            # Block until a packet arrives or the next delayed send is due
+            # (heap deadlines are integer nanoseconds on the monotonic
+            # clock: immune to wall-clock jumps and cheaper to compare)
+            if pending_delays:
+                wait = max(0, pending_delays[0][0] - monotonic_ns()) / 1e9
             else:
-                # Packet from client to server (DATA)
-                metrics['client_to_server_packets'] += 1
-                
-                # Detailed packet logging
-                packet_info = f"CLIENT → SERVER: "
-                if seq_num is not None and msg_type is not None:
-                    packet_info += f"seq={seq_num}, type={msg_type}"
-                    if msg_type == "DATA":
-                        packet_info += f", message=\"{payload[:50]}\"" + ("..." if len(payload) > 50 else "")
-                else:
-                    packet_info += f"[Unparseable packet: {data[:20]}...]"
-                
-                log(config['verbose'], packet_info, force=True)
-                
-                # Update latest client
-                latest_client = addr
-                log(config['verbose'], f"  Client address updated: {latest_client}")
-                
-                # Check if we should drop this packet (using dynamic config)
-                if should_drop_packet(config['client_drop']):
-                    metrics['client_to_server_dropped'] += 1
-                    log(config['verbose'], f"  ACTION: DROPPED packet to server (probability: {config['client_drop']*100:.1f}%)", force=True)
-                elif should_delay_packet(config['client_delay']):
-                    # Calculate when to send the packet (using dynamic config)
-                    delay = get_random_delay(config['client_delay_time_range'])
-                    send_time = time.time() + delay
-                    
-                    # Queue the packet for delayed sending
-                    delayed_packets.put((send_time, proxy_socket, server_addr, data))
-                    metrics['client_to_server_delayed'] += 1
-                    log(config['verbose'], f"  ACTION: DELAYED packet to server by {delay*1000:.1f}ms", force=True)
-                
-                    # Add delay time to client delay array
-                    delayClient.append(delay)
+                wait = None
+            readable = sel_select(wait)
+
+            # Deliver delayed packets whose deadline has passed; they go
+            # onto the same per-direction batches as fresh forwards so a
+            # spike of expiring deadlines drains in one sendmmsg call
+            now = monotonic_ns()
+            while pending_delays and pending_delays[0][0] <= now:
+                _, _, target, data = heappop(pending_delays)
+
+                # Queue on the batch for the packet's direction
+                if target is None:
+                    pending_to_server.append(data)
                 else:
-                    # Forward to server immediately
-                    log(config['verbose'], f"  ACTION: FORWARDED to server: {server_addr}", force=True)
-                    proxy_socket.sendto(data, server_addr)
-            
-            # Print metrics every 10 packets
-            if metrics['total_packets'] % 10 == 0:
-                print("\n" + "="*50)
-                print("PROXY METRICS SUMMARY:")
-                print("="*50)
-                print(f"Total packets handled: {metrics['total_packets']}")
-                
-                # Client to Server metrics
-                c2s_total = metrics['client_to_server_packets']
-                c2s_drop_pct = (metrics['client_to_server_dropped'] / max(1, c2s_total)) * 100
-                c2s_delay_pct = (metrics['client_to_server_delayed'] / max(1, c2s_total)) * 100
-                c2s_forward_pct = 100 - c2s_drop_pct - c2s_delay_pct
-                
-                print(f"\nClient→Server: {c2s_total} packets")
-                print(f"  - Forwarded: {c2s_total - metrics['client_to_server_dropped'] - metrics['client_to_server_delayed']} ({c2s_forward_pct:.1f}%)")
-                print(f"  - Dropped:   {metrics['client_to_server_dropped']} ({c2s_drop_pct:.1f}%)")
-                print(f"  - Delayed:   {metrics['client_to_server_delayed']} ({c2s_delay_pct:.1f}%)")
-                
-                # Server to Client metrics
-                s2c_total = metrics['server_to_client_packets']
-                s2c_drop_pct = (metrics['server_to_client_dropped'] / max(1, s2c_total)) * 100
-                s2c_delay_pct = (metrics['server_to_client_delayed'] / max(1, s2c_total)) * 100
-                s2c_forward_pct = 100 - s2c_drop_pct - s2c_delay_pct
-                
-                print(f"\nServer→Client: {s2c_total} packets")
-                print(f"  - Forwarded: {s2c_total - metrics['server_to_client_dropped'] - metrics['server_to_client_delayed']} ({s2c_forward_pct:.1f}%)")
-                print(f"  - Dropped:   {metrics['server_to_client_dropped']} ({s2c_drop_pct:.1f}%)")
-                print(f"  - Delayed:   {metrics['server_to_client_delayed']} ({s2c_delay_pct:.1f}%)")
-                
-                print("="*50)
+                    pending_to_client.append((data, target))
+
+                # Only parse the packet for logging when verbose is on
+                if verbose:
+                    seq_num, msg_type, _ = parse_packet(data)
+                    packet_type = f"seq={seq_num}, type={MSG_NAMES.get(msg_type, msg_type)}" if seq_num is not None else "unparseable"
+                    log(verbose, f"  DELIVERED delayed packet ({packet_type}) to {target if target is not None else server_addr}")
+
+            # Nothing to read means the select timed out on a delay
+            # deadline; flush whatever the drain queued and wait again
+            if not readable:
+                if pending_to_server:
+                    # a refused send means the server is down; the packets
+                    # are lost either way, so just drop the batch
+                    try:
+                        mmsg.send_batch_connected(server_sock, pending_to_server)
+                    except ConnectionRefusedError:
+                        log(verbose, "Server unreachable (connection refused); dropping batch")
+                    pending_to_server.clear()
+                if pending_to_client:
+                    mmsg.send_batch(proxy_socket, pending_to_client)
+                    pending_to_client.clear()
+                continue
+
+            # Snapshot the hot config fields once per wakeup instead of
+            # re-reading them for every packet in the batch
+            client_drop_thr = config.client_drop_thr
+            client_delay_thr = config.client_delay_thr
+            client_delay_range = config.client_delay_time_range
+            server_drop_thr = config.server_drop_thr
+            server_delay_thr = config.server_delay_thr
+            server_delay_range = config.server_delay_time_range
+
+            # Receive a batch of packets from each readable socket
+            # (one recvmmsg syscall pulls up to BATCH_SIZE datagrams)
+            for key, _events in readable:
+                ready_sock = key.fileobj
+
+                # A down server answers forwards with ICMP port-unreachable,
+                # which the connected socket reports on the next recv; drop
+                # the error and keep serving instead of crashing the proxy
+                try:
+                    batch = recv_batch(ready_sock)
+                except ConnectionRefusedError:
+                    log(verbose, "Server unreachable (connection refused); continuing")
+                    continue
 
-                # Add total delay time to delay total
-                delayTotal.append(sum(delayClient) + sum(delayServer))
+                for data, addr in batch:
+                    metrics[M_TOTAL] += 1
+
+                    # Packets on the connected socket come from the server;
+                    # everything on the listening socket comes from a client
+                    if ready_sock is server_sock:
+                        # Packet from server to client (ACK)
+                        metrics[M_S2C] += 1
+                
+                        # Detailed packet logging; forwarding only needs the
+                        # raw bytes, so the header is parsed lazily here
+                        if verbose:
+                            seq_num, msg_type, payload = parse_packet(data)
+                            packet_info = f"SERVER → CLIENT: "
+                            if seq_num is not None and msg_type is not None:
+                                packet_info += f"seq={seq_num}, type={MSG_NAMES.get(msg_type, msg_type)}"
+                                if msg_type == MSG_ACK:
+                                    packet_info += f" (Acknowledgment for sequence {seq_num})"
+                                elif msg_type == MSG_DATA:
+                                    packet_info += f", payload_size={len(payload or b'')}"
+                            else:
+                                packet_info += f"[Unparseable packet: {data[:20]}...]"
+
+                            log(verbose, packet_info)
+                
+                        if latest_client:
+                            # Decide the packet's fate (using dynamic config)
+                            action, delay = decide_action(server_drop_thr, server_delay_thr,
+                                                          server_delay_range)
+                            if action == ACTION_DROP:
+                                metrics[M_S2C_DROP] += 1
+                                if verbose:
+                                    log(verbose, f"  ACTION: DROPPED packet to client (probability: {config.server_drop*100:.1f}%)")
+                            elif action == ACTION_DELAY:
+                                # Calculate when to send the packet
+                                send_time = monotonic_ns() + int(delay * 1e9)
+
+                                # Queue the packet for delayed sending
+                                heappush(pending_delays, (send_time, next(delay_tiebreak), latest_client, data))
+                                metrics[M_S2C_DELAY] += 1
+                                if verbose:
+                                    log(verbose, f"  ACTION: DELAYED packet to client by {delay*1000:.1f}ms")
+                    
+                                # Accumulate delay time for the server direction
+                                delay_sums[1] += delay
+                            else:
+                                # Forward to the client on the next batch flush
+                                if verbose:
+                                    log(verbose, f"  ACTION: FORWARDED to client: {latest_client}")
+                                pending_to_client.append((data, latest_client))
+                        else:
+                            print(f"  ERROR: No client to forward to. Packet dropped.")
+                    else:
+                        # Packet from client to server (DATA)
+                        metrics[M_C2S] += 1
+                
+                        # Detailed packet logging; forwarding only needs the
+                        # raw bytes, so the header is parsed lazily here
+                        if verbose:
+                            seq_num, msg_type, payload = parse_packet(data)
+                            packet_info = f"CLIENT → SERVER: "
+                            if seq_num is not None and msg_type is not None:
+                                packet_info += f"seq={seq_num}, type={MSG_NAMES.get(msg_type, msg_type)}"
+                                if msg_type == MSG_DATA:
+                                    packet_info += f", message=\"{payload[:50].decode(errors='replace')}\"" + ("..." if len(payload) > 50 else "")
+                            else:
+                                packet_info += f"[Unparseable packet: {data[:20]}...]"
+
+                            log(verbose, packet_info)
+                
+                        # Update latest client
+                        latest_client = addr
+                        if verbose:
+                            log(verbose, f"  Client address updated: {latest_client}")
+                
+                        # Decide the packet's fate (using dynamic config)
+                        action, delay = decide_action(client_drop_thr, client_delay_thr,
+                                                      client_delay_range)
+                        if action == ACTION_DROP:
+                            metrics[M_C2S_DROP] += 1
+                            if verbose:
+                                log(verbose, f"  ACTION: DROPPED packet to server (probability: {config.client_drop*100:.1f}%)")
+                        elif action == ACTION_DELAY:
+                            # Calculate when to send the packet
+                            send_time = monotonic_ns() + int(delay * 1e9)
+
+                            # Queue the packet for delayed sending
+                            heappush(pending_delays, (send_time, next(delay_tiebreak), None, data))
+                            metrics[M_C2S_DELAY] += 1
+                            if verbose:
+                                log(verbose, f"  ACTION: DELAYED packet to server by {delay*1000:.1f}ms")
+                
+                            # Accumulate delay time for the client direction
+                            delay_sums[0] += delay
+                        else:
+                            # Forward to server on the next batch flush
+                            if verbose:
+                                log(verbose, f"  ACTION: FORWARDED to server: {server_addr}")
+                            pending_to_server.append(data)
+
+            # Flush pending forwards at the batch boundary
+            # (amortizes syscalls via sendmmsg)
+            if pending_to_server:
+                # a refused send means the server is down; the packets
+                # are lost either way, so just drop the batch
+                try:
+                    mmsg.send_batch_connected(server_sock, pending_to_server)
+                except ConnectionRefusedError:
+                    log(verbose, "Server unreachable (connection refused); dropping batch")
+                pending_to_server.clear()
+            if pending_to_client:
+                mmsg.send_batch(proxy_socket, pending_to_client)
+                pending_to_client.clear()
 
-                # Empty delay arrays
-                delayClient.clear()
-                delayServer.clear()
-                
     except KeyboardInterrupt:
         print("\nProxy shutting down gracefully...")
     except Exception as e:
         print(f"Error: {e}")
     finally:
         proxy_socket.close()
+        server_sock.close()
         print("Proxy socket closed.")
-        
-        # Draw latency graph and save the file
-        y = np.array(delayTotal) * 1000
+
+        # Import the plotting stack lazily: matplotlib costs hundreds of
+        # milliseconds and tens of MB that runs killed before shutdown
+        # never need. Agg skips GUI backend probing.
+        import numpy as np
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        # Draw latency graph and save the file; when the ring has
+        # wrapped, the oldest sample sits right after the write index
+        count = sample_state[0]
+        if count <= MAX_DELAY_SAMPLES:
+            samples = delay_samples[:count]
+        else:
+            split = count % MAX_DELAY_SAMPLES
+            samples = delay_samples[split:] + delay_samples[:split]
+        y = np.array(samples) * 1000
         plt.plot(y)
-        plt.xlabel("Every 10 Packets")
+        plt.xlabel("Metrics Ticks (1s)")
         plt.ylabel("Latency in ms")
         plt.title("Proxy Latency with Delay Configuration Graph")
         plt.savefig("graphs/Proxy Graph - " + strftime("%Y-%m-%d %H:%M:%S", localtime()))
@@ -1,16 +1,46 @@
 #!/usr/bin/env python3
+import os
 import sys
 import socket
 import argparse
+import array
+import selectors
+import struct
 import time
 import threading
+import queue
+import signal
+import mmsg
 import numpy as np
 import matplotlib.pyplot as plt
 from time import localtime, strftime
+from collections import OrderedDict
 
 # maximum port number
 MAX_PORT_NUM = 65535
 
+# fixed-size packet header: sequence number (uint32) + message type (uint8)
+HEADER = struct.Struct("!IB")
+
+# message type codes
+MSG_DATA = 0
+MSG_ACK = 1
+
+# human-readable names for message types in log output
+MSG_NAMES = {MSG_DATA: "DATA", MSG_ACK: "ACK"}
+
+# indexes into the metrics counter array
+S_RECV, S_UNIQUE, S_DUP, S_ACK = range(4)
+
+# cap on tracked clients; least recently seen entries are evicted so a
+# long-running server's memory stays bounded
+MAX_TRACKED_CLIENTS = 65536
+
+# ACKs always answer a just-received packet, so MSG_CONFIRM (where the
+# platform has it) tells the kernel the peer is alive and skips
+# redundant neighbour (ARP) revalidation traffic
+ACK_SEND_FLAGS = getattr(socket, 'MSG_CONFIRM', 0)
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Reliable UDP Server')
@@ -18,6 +48,12 @@ def parse_arguments():
                         help='IP address to listen on')
     parser.add_argument('--listen-port', type=int, default=5000,
                         help='Port to listen on')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Enable per-packet logging')
+    parser.add_argument('--cpu', type=int, default=None,
+                        help='Pin the server to this CPU and steer received packets to it (Linux only)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes sharing the port via SO_REUSEPORT (Linux only)')
     
     args = parser.parse_args()
 
@@ -35,6 +71,18 @@ def parse_arguments():
         # show error message and exit
         usage(1, "Valid listen port number range is between 0 to 65535.")
 
+    # if a CPU number was given, it cannot be negative
+    if(args.cpu is not None and args.cpu < 0):
+
+        # show error message and exit
+        usage(1, "The CPU number cannot be negative.")
+
+    # the worker count must be at least one
+    if(args.workers < 1):
+
+        # show error message and exit
+        usage(1, "The number of workers must be at least 1.")
+
     return args
 
 def usage(exit_code, exit_message):
@@ -48,119 +96,291 @@ def usage(exit_code, exit_message):
     # exit the program using the exit_code
     sys.exit(exit_code)
 
-def create_packet(seq_num, message_type, payload=""):
-    """Create a packet with the protocol format."""
-    return f"{seq_num}|{message_type}|{payload}".encode()
+def create_packet(seq_num, message_type, payload=b""):
+    """Create a packet with the fixed binary header followed by the payload."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return HEADER.pack(seq_num, message_type) + payload
 
 def parse_packet(packet_data):
-    """Parse a packet according to the protocol format."""
-    parts = packet_data.decode().split('|', 2)
-    if len(parts) < 3:
+    """Parse the fixed binary header of a packet."""
+    if len(packet_data) < HEADER.size:
         return None, None, None
-    return int(parts[0]), parts[1], parts[2]
+    seq_num, msg_type = HEADER.unpack_from(packet_data)
+    return seq_num, msg_type, packet_data[HEADER.size:]
 
-def input_listener(exit_event):
-    """Wait for user input and set exit_event when 'exit' is typed."""
+def set_socket_buffers(sock, rcvbuf=8*1024*1024, sndbuf=4*1024*1024):
+    """Enlarge the kernel socket buffers so bursts are not silently dropped.
+
+    The kernel may clamp the request; warn when the granted size is
+    smaller than asked (raising sysctl net.core.rmem_max/wmem_max lifts
+    the cap).
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    granted_rcv = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    granted_snd = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    if granted_rcv < rcvbuf:
+        print(f"Warning: kernel clamped SO_RCVBUF to {granted_rcv} bytes (requested {rcvbuf})")
+    if granted_snd < sndbuf:
+        print(f"Warning: kernel clamped SO_SNDBUF to {granted_snd} bytes (requested {sndbuf})")
+
+def report_metrics(metrics, interval=1.0):
+    """Print a metrics summary once per interval from a background thread.
+
+    Reading the counters from another thread is safe with a single
+    writer under the GIL; quiet intervals print nothing.
+    """
+    last_recv = 0
     while True:
-        user_input = input()
-        if user_input.strip().lower() == "exit":
-            exit_event.set()
-            break
+        time.sleep(interval)
+        received = metrics[S_RECV]
+        if received == last_recv:
+            continue
+        last_recv = received
+        summary = "\n".join([
+            "",
+            "Server Metrics:",
+            f"Total packets received: {received}",
+            f"Unique packets: {metrics[S_UNIQUE]}",
+            f"Duplicate packets: {metrics[S_DUP]}",
+            f"ACKs sent: {metrics[S_ACK]}",
+            f"Duplication rate: {(metrics[S_DUP]/received)*100:.2f}%",
+            "",
+            "",
+        ])
+        sys.stdout.write(summary)
+        sys.stdout.flush()
+
+# timestamp for log lines, refreshed at most once per second
+_last_log_sec = 0
+_last_log_ts = ""
+
+def log_timestamp():
+    """Return the HH:MM:SS timestamp, recomputing at most once per second."""
+    global _last_log_sec, _last_log_ts
+    now = int(time.time())
+    if now != _last_log_sec:
+        _last_log_ts = time.strftime('%H:%M:%S')
+        _last_log_sec = now
+    return _last_log_ts
+
+def log_writer(log_q):
+    """Drain queued log lines to stdout from a background thread.
+
+    Keeps the write/flush syscalls off the packet path; flushing only
+    when the queue runs empty coalesces bursts into one flush.
+    """
+    while True:
+        message = log_q.get()
+        sys.stdout.write(message)
+        if log_q.empty():
+            sys.stdout.flush()
 
 def main():
     args = parse_arguments()
-    
-    # Initialize metrics
-    packets_received = 0
-    unique_packets_received = 0
-    duplicate_packets = 0
-    acks_sent = 0
+
+    # Optional CPU pinning: keeping the process on the CPU that services
+    # the NIC's RX queue avoids bouncing packets across cores (pair with
+    # echo <cpu> > /proc/irq/<nic-irq>/smp_affinity_list)
+    if args.cpu is not None:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {args.cpu})
+            print(f"Pinned to CPU {args.cpu}")
+        else:
+            print("Warning: CPU pinning is not supported on this platform")
+
+    # Metrics: contiguous unboxed int64 counters indexed by the S_*
+    # constants, shared with the reporter thread
+    metrics = array.array('q', [0] * 4)
+
+    # Optional SO_REUSEPORT worker pool: every process binds its own
+    # socket on the same port and the kernel hashes flows across them,
+    # giving real parallelism past the GIL. A client's flow sticks to
+    # one worker, so the per-client dedup state needs no sharing.
+    worker_id = 0
+    worker_pids = []
+    if args.workers > 1:
+        if hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT'):
+            # the parent keeps the child pids so its shutdown path can
+            # forward the signal and reap them; a child clears the list
+            # so it never tries to signal its siblings
+            for i in range(1, args.workers):
+                pid = os.fork()
+                if pid == 0:
+                    worker_id = i
+                    worker_pids = []
+                    break
+                worker_pids.append(pid)
+            print(f"Worker {worker_id} started (pid {os.getpid()})")
+        else:
+            print("Warning: SO_REUSEPORT workers are not supported on this platform; running a single process")
 
     # Create UDP socket
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    # Let additional server processes bind the same port so the kernel
+    # can fan flows out across them; must be set before bind, and the
+    # option only exists on platforms that support it
+    if hasattr(socket, 'SO_REUSEPORT'):
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
     server_socket.bind((args.listen_ip, args.listen_port))
+    set_socket_buffers(server_socket)
+
+    # Steer received packets to the pinned CPU so the kernel's RX
+    # processing and this process share a cache (Linux-only option)
+    if args.cpu is not None and hasattr(socket, 'SO_INCOMING_CPU'):
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_INCOMING_CPU, args.cpu)
+
+    # Preallocated recvmmsg state for batched receives
+    receiver = mmsg.BatchReceiver(1024)
     
-    # Track last sequence number seen from each client
-    client_seq_nums = {}
+    # Track last sequence number seen from each client, LRU-ordered so
+    # the oldest entry can be evicted when the table hits its cap
+    client_seq_nums = OrderedDict()
     
     print(f"UDP Server started. Listening on {args.listen_ip}:{args.listen_port}")
+    print("Press Ctrl-C to stop.")
     
-    # Create an event to signal exit
-    exit_event = threading.Event()
-    # Start a thread to listen for user input ("exit")
-    input_thread = threading.Thread(target=input_listener, args=(exit_event,), daemon=True)
-    input_thread.start()
+    # Selector driving the main loop (epoll on Linux) plus a pipe the
+    # SIGINT/SIGTERM handlers write to, so shutdown wakes the loop right
+    # away instead of waiting out a poll timeout
+    sel = selectors.DefaultSelector()
+    sel.register(server_socket, selectors.EVENT_READ)
+    exit_pipe_r, exit_pipe_w = os.pipe()
+    sel.register(exit_pipe_r, selectors.EVENT_READ)
+
+    # SIGINT/SIGTERM write the exit pipe: shutdown works even when stdin
+    # is closed or piped, and no thread sits blocked on input()
+    def request_exit(_signum, _frame):
+        os.write(exit_pipe_w, b"x")
+    signal.signal(signal.SIGINT, request_exit)
+    signal.signal(signal.SIGTERM, request_exit)
+
+    # Queue feeding the background log writer; the recv loop only ever
+    # enqueues preformatted lines
+    log_q = queue.SimpleQueue()
+    log_thread = threading.Thread(target=log_writer, args=(log_q,), daemon=True)
+    log_thread.start()
+
+    # Per-packet logging is opt-in; metric summaries still print
+    verbose = args.verbose
+
+    # Start the metrics reporter thread (prints at most once per second,
+    # replacing the per-10-packets block that ran on the hot path)
+    metrics_thread = threading.Thread(target=report_metrics, args=(metrics,),
+                                      daemon=True)
+    metrics_thread.start()
     
+    # ACKs for one receive batch, flushed with a single sendmmsg; the
+    # set collapses retransmit clusters of the same (client, seq) that
+    # land inside one batch down to a single ACK
+    ack_batch = []
+    acked_this_batch = set()
+
+    # ACKs are header-only, so pack the 5 bytes directly instead of
+    # going through create_packet's payload handling
+    ack_pack = HEADER.pack
+
     try:
-        while not exit_event.is_set():
-            # Set a short timeout for recvfrom to periodically check the exit_event.
-            server_socket.settimeout(1.0)
-            try:
-                data, client_addr = server_socket.recvfrom(1024)
-            except socket.timeout:
-                continue  # Go back and check for exit_event
-            packets_received += 1
-            
-            # Parse the packet
-            seq_num, msg_type, payload = parse_packet(data)
-            if seq_num is None:
-                print("Received malformed packet.")
-                continue
-            
-            client_key = f"{client_addr[0]}:{client_addr[1]}"
-            
-            # Check if this is a new packet from this client
-            is_new_packet = False
-            if client_key not in client_seq_nums:
-                client_seq_nums[client_key] = seq_num - 1
-                is_new_packet = True
-            elif seq_num > client_seq_nums[client_key]:
-                is_new_packet = True
-            
-            # Update metrics based on whether this is a new or duplicate packet
-            if is_new_packet:
-                unique_packets_received += 1
-                client_seq_nums[client_key] = seq_num
-                print(f"[{time.strftime('%H:%M:%S')}] Received new packet from {client_key}:")
-                print(f"  Sequence: {seq_num}, Type: {msg_type}, Message: {payload}")
-            else:
-                duplicate_packets += 1
-                print(f"[{time.strftime('%H:%M:%S')}] Received duplicate packet from {client_key}:")
-                print(f"  Sequence: {seq_num}, Type: {msg_type} (already processed)")
-            
-            # Send ACK regardless of whether it's a new packet or duplicate
-            ack_packet = create_packet(seq_num, "ACK")
-            server_socket.sendto(ack_packet, client_addr)
-            acks_sent += 1
-            
-            # Print periodic metrics (every 10 packets)
-            if packets_received % 10 == 0:
-                print("\nServer Metrics:")
-                print(f"Total packets received: {packets_received}")
-                print(f"Unique packets: {unique_packets_received}")
-                print(f"Duplicate packets: {duplicate_packets}")
-                print(f"ACKs sent: {acks_sent}")
-                print(f"Duplication rate: {(duplicate_packets/packets_received)*100:.2f}%\n")
-                
+        running = True
+        while running:
+            # Block until the socket is readable or the exit pipe is
+            # written; no periodic timeout wakeups needed
+            for key, _events in sel.select():
+                if key.fd == exit_pipe_r:
+                    # drain the wakeup byte and stop
+                    os.read(exit_pipe_r, 1)
+                    running = False
+                    continue
+
+                # Pull up to a whole batch of datagrams in one syscall
+                for data, client_addr in receiver.recv_batch(server_socket):
+                    metrics[S_RECV] += 1
+
+                    # Parse the packet
+                    seq_num, msg_type, payload = parse_packet(data)
+                    if seq_num is None:
+                        log_q.put_nowait("Received malformed packet.\n")
+                        continue
+
+                    # One pop decides new-vs-duplicate: an unknown client
+                    # defaults to seq_num - 1 so its first packet counts as
+                    # new, and reinserting updates the high-water mark while
+                    # refreshing the entry's LRU recency in the same store
+                    prev = client_seq_nums.pop(client_addr, seq_num - 1)
+                    is_new_packet = seq_num > prev
+                    client_seq_nums[client_addr] = seq_num if is_new_packet else prev
+
+                    # evict the least recently seen client at the cap
+                    if len(client_seq_nums) > MAX_TRACKED_CLIENTS:
+                        client_seq_nums.popitem(last=False)
+
+                    # Update metrics based on whether this is a new or duplicate packet
+                    if is_new_packet:
+                        metrics[S_UNIQUE] += 1
+                        if verbose:
+                            log_q.put_nowait(
+                                f"[{log_timestamp()}] Received new packet from {client_addr[0]}:{client_addr[1]}:\n"
+                                f"  Sequence: {seq_num}, Type: {MSG_NAMES.get(msg_type, msg_type)}, Message: {payload.decode(errors='replace')}\n")
+                    else:
+                        metrics[S_DUP] += 1
+                        if verbose:
+                            log_q.put_nowait(
+                                f"[{log_timestamp()}] Received duplicate packet from {client_addr[0]}:{client_addr[1]}:\n"
+                                f"  Sequence: {seq_num}, Type: {MSG_NAMES.get(msg_type, msg_type)} (already processed)\n")
+
+                    # Queue an ACK regardless of whether it's a new packet or
+                    # duplicate, but at most once per (client, seq) per batch
+                    ack_key = (client_addr, seq_num)
+                    if ack_key not in acked_this_batch:
+                        acked_this_batch.add(ack_key)
+                        ack_batch.append((ack_pack(seq_num, MSG_ACK), client_addr))
+
+                # Flush the whole batch of ACKs in one sendmmsg call
+                if ack_batch:
+                    metrics[S_ACK] += mmsg.send_batch(server_socket, ack_batch,
+                                                      ACK_SEND_FLAGS)
+                    ack_batch.clear()
+                    acked_this_batch.clear()
+
     except Exception as e:
         print(f"Error: {e}")
     finally:
         print("\nExiting server. Final Metrics:")
-        print(f"Total packets received: {packets_received}")
-        print(f"Unique packets: {unique_packets_received}")
-        print(f"Duplicate packets: {duplicate_packets}")
-        print(f"ACKs sent: {acks_sent}")
-        print(f"Duplication rate: {(duplicate_packets/packets_received)*100:.2f}%")
+        print(f"Total packets received: {metrics[S_RECV]}")
+        print(f"Unique packets: {metrics[S_UNIQUE]}")
+        print(f"Duplicate packets: {metrics[S_DUP]}")
+        print(f"ACKs sent: {metrics[S_ACK]}")
+        print(f"Duplication rate: {(metrics[S_DUP]/max(1, metrics[S_RECV]))*100:.2f}%")
         server_socket.close()
 
+        # Stopping the parent must stop the pool: forward the shutdown
+        # to every forked worker (each runs its own signal handler and
+        # exits cleanly) and reap them so none are left orphaned and
+        # still bound to the port
+        for pid in worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in worker_pids:
+            os.waitpid(pid, 0)
+
    # Draw graph
     x = np.array(["Sent", "Received", "Retransmissions", "Lost"])
-    y = np.array([acks_sent, packets_received, 0, acks_sent-packets_received])
+    y = np.array([metrics[S_ACK], metrics[S_RECV], 0, metrics[S_ACK]-metrics[S_RECV]])
     plt.bar(x, y)
     plt.xlabel("Packets")
     plt.ylabel("Number of Packets")
     plt.title("Server Packet Communication Graph")
-    plt.savefig("graphs/Server Graph - " + strftime("%Y-%m-%d %H:%M:%S", localtime()))
+
+    # each worker saves its own graph so they do not overwrite each other
+    graph_name = "graphs/Server Graph - " + strftime("%Y-%m-%d %H:%M:%S", localtime())
+    if args.workers > 1:
+        graph_name += f" (worker {worker_id})"
+    plt.savefig(graph_name)
 
 if __name__ == "__main__":
     main()